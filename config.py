@@ -1,45 +1,103 @@
 """Configuration settings for the STT Corrector RAG system."""
 
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
-load_dotenv()
+_DOTENV_LOADED = False
+
+
+def _ensure_dotenv() -> None:
+    """Parse the .env file at most once per process."""
+    global _DOTENV_LOADED
+    if not _DOTENV_LOADED:
+        load_dotenv()
+        _DOTENV_LOADED = True
+
+
+@lru_cache(maxsize=None)
+def _env(key: str, default: str) -> str:
+    """Read an environment variable once per process."""
+    _ensure_dotenv()
+    return os.getenv(key, default)
 
 
 class Config:
     # Embedding model
-    EMBEDDING_MODEL: str = os.getenv(
+    EMBEDDING_MODEL: str = _env(
         "EMBEDDING_MODEL",
         "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
     )
     
+    # Ukuran batch saat meng-encode banyak teks sekaligus
+    EMBEDDING_BATCH_SIZE: int = int(_env("EMBEDDING_BATCH_SIZE", "64"))
+    # Jumlah maksimum embedding teks yang disimpan di cache (LRU, 0 = nonaktif)
+    EMBEDDING_CACHE_SIZE: int = int(_env("EMBEDDING_CACHE_SIZE", "8192"))
+    # Backend inference SentenceTransformer: "torch", "onnx", atau "openvino"
+    # (onnx/openvino butuh sentence-transformers>=3.2; gagal dimuat = kembali ke torch)
+    EMBEDDING_BACKEND: str = _env("EMBEDDING_BACKEND", "torch")
+    # Nama file model untuk onnx/openvino, misal "onnx/model_qint8_avx512_vnni.onnx" (kosong = default)
+    EMBEDDING_MODEL_FILE: str = _env("EMBEDDING_MODEL_FILE", "")
+    # URL server embedding bersama (python -m src.embed_server). Kosong = model dimuat
+    # di setiap proses yang memakai EmbeddingModel.
+    EMBEDDING_SERVER_URL: str = _env("EMBEDDING_SERVER_URL", "")
+    EMBEDDING_SERVER_PORT: int = int(_env("EMBEDDING_SERVER_PORT", "8001"))
+    
     # ChromaDB
-    CHROMA_PERSIST_DIR: str = os.getenv("CHROMA_PERSIST_DIR", "./data/chroma_db")
+    CHROMA_PERSIST_DIR: str = _env("CHROMA_PERSIST_DIR", "./data/chroma_db")
     COLLECTION_NAME: str = "stt_corrections"
     
     # Server
-    HOST: str = os.getenv("HOST", "0.0.0.0")
-    PORT: int = int(os.getenv("PORT", "8000"))
+    HOST: str = _env("HOST", "0.0.0.0")
+    PORT: int = int(_env("PORT", "8000"))
+    # Auto-reload hanya untuk development ("1")
+    DEV_RELOAD: bool = _env("DEV_RELOAD", "0") == "1"
     
     # ============================================================
     # LLM Backend: Pilih SALAH SATU dengan uncomment yang sesuai
     # ============================================================
     
     # === OPSI 1: Ollama (default) ===
-    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "ollama")
-    OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-    LLM_MODEL: str = os.getenv("LLM_MODEL", "llama3.2:latest")
+    LLM_BACKEND: str = _env("LLM_BACKEND", "ollama")
+    OLLAMA_BASE_URL: str = _env("OLLAMA_BASE_URL", "http://localhost:11434")
+    LLM_MODEL: str = _env("LLM_MODEL", "llama3.2:latest")
+    # Lama model tetap dimuat di memori Ollama setelah request terakhir
+    LLM_KEEP_ALIVE: str = _env("LLM_KEEP_ALIVE", "30m")
     
     # === OPSI 2: llama.cpp ===
     # Uncomment 2 baris di bawah, comment 3 baris di atas (OPSI 1)
-    # LLM_BACKEND: str = os.getenv("LLM_BACKEND", "llama_cpp")
-    # LLAMA_CPP_URL: str = os.getenv("LLAMA_CPP_URL", "http://localhost:8080")
+    # LLM_BACKEND: str = _env("LLM_BACKEND", "llama_cpp")
+    # LLAMA_CPP_URL: str = _env("LLAMA_CPP_URL", "http://localhost:8080")
+
+    # Maksimum request LLM bersamaan dari /correct/batch.
+    # Samakan dengan OLLAMA_NUM_PARALLEL (Ollama) atau --parallel (llama.cpp server).
+    LLM_MAX_CONCURRENCY: int = int(_env("LLM_MAX_CONCURRENCY", "4"))
+
+    # Jumlah koneksi keep-alive idle yang disimpan per host LLM
+    HTTP_POOL_SIZE: int = int(_env("HTTP_POOL_SIZE", "16"))
+
+    # Minta Ollama memuat model di background saat server API start ("1" = ya)
+    # supaya model sudah dimuat sebelum request pertama dari user
+    LLM_WARMUP: bool = _env("LLM_WARMUP", "1") == "1"
 
     # RAG settings
     TOP_K_RESULTS: int = 5
-    SIMILARITY_THRESHOLD: float = 0.3
-    # Ambang similarity untuk direct match (0-1). Lebih rendah = lebih agresif koreksi.
-    DIRECT_MATCH_THRESHOLD: float = 0.7
+    # Ambang cosine similarity minimal agar kandidat dikembalikan oleh search.
+    # Kedua ambang di bawah perlu dikalibrasi per model/KB: python scripts/calibrate_thresholds.py
+    SIMILARITY_THRESHOLD: float = float(_env("SIMILARITY_THRESHOLD", "0.5"))
+    # Ambang cosine similarity untuk direct match (0-1). Lebih rendah = lebih agresif koreksi.
+    DIRECT_MATCH_THRESHOLD: float = float(_env("DIRECT_MATCH_THRESHOLD", "0.9"))
+    # Lewati panggilan LLM bila tidak ada kandidat dari knowledge base ("1" = ya).
+    # Default "0": LLM tetap dipakai untuk normalisasi ejaan umum.
+    LLM_REQUIRE_CANDIDATES: bool = _env("LLM_REQUIRE_CANDIDATES", "0") == "1"
+    # Semantic cache hasil search: query dengan cosine >= ambang ini ke query
+    # sebelumnya memakai hasil yang sama. SIZE = jumlah query yang diingat (0 = nonaktif)
+    SEMANTIC_CACHE_THRESHOLD: float = float(_env("SEMANTIC_CACHE_THRESHOLD", "0.97"))
+    SEMANTIC_CACHE_SIZE: int = int(_env("SEMANTIC_CACHE_SIZE", "256"))
+    # Kuantisasi matriks embedding KB di memori: "none" (float32), "fp16", atau "int8"
+    KB_QUANTIZATION: str = _env("KB_QUANTIZATION", "none")
+    # Jumlah maksimum hasil correct() yang disimpan di cache (LRU)
+    CORRECTION_CACHE_SIZE: int = int(_env("CORRECTION_CACHE_SIZE", "4096"))
 
 
 config = Config()
@@ -11,9 +11,15 @@ if __name__ == "__main__":
     ╚══════════════════════════════════════════════════════════╝
     """)
     
+    # Selalu satu worker: chromadb.PersistentClient tidak mendukung beberapa proses
+    # pada direktori yang sama, dan matriks KB di memori hanya tahu perubahan dari
+    # prosesnya sendiri (/knowledge/add di satu worker tidak terlihat di worker lain)
     uvicorn.run(
         "src.api:app",
         host=config.HOST,
         port=config.PORT,
-        reload=True
+        reload=config.DEV_RELOAD,
+        workers=1,
+        loop="uvloop",
+        http="httptools"
     )
@@ -0,0 +1,86 @@
+"""Script to derive similarity thresholds from the knowledge base.
+
+Menghitung distribusi cosine similarity antar varian knowledge base:
+- positif: kesalahan umum vs frasa benarnya sendiri (harus lolos direct match)
+- negatif: varian vs varian terdekat dari entri LAIN (tidak boleh lolos direct match)
+dan membandingkannya dengan skor lama ``1 / (1 + squared L2)`` pada embedding mentah.
+"""
+
+import sys
+import os
+import json
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.embeddings import EmbeddingModel
+
+# Jarak aman di atas negatif tertinggi untuk saran DIRECT_MATCH_THRESHOLD
+_MARGIN = 0.02
+
+
+def _percentiles(values: np.ndarray) -> str:
+    p = np.percentile(values, [0, 5, 25, 50, 75, 95, 100])
+    return "  ".join(f"p{q}={v:.3f}" for q, v in zip([0, 5, 25, 50, 75, 95, 100], p))
+
+
+def main():
+    kb_path = os.path.join(
+        os.path.dirname(os.path.dirname(__file__)),
+        "data",
+        "knowledge_base.json"
+    )
+    with open(kb_path, "r", encoding="utf-8") as f:
+        corrections = json.load(f)["corrections"]
+
+    texts, owners = [], []
+    for entry_idx, entry in enumerate(corrections):
+        for text in [entry["correct_phrase"]] + entry.get("common_mistakes", []):
+            texts.append(text)
+            owners.append(entry_idx)
+    owners = np.asarray(owners)
+    is_phrase = np.r_[True, owners[1:] != owners[:-1]]
+
+    # Selalu encode lokal: butuh embedding mentah (tanpa normalisasi) untuk skor lama
+    model = EmbeddingModel(server_url="")
+    raw = model.model.encode(texts, convert_to_numpy=True, normalize_embeddings=False).astype(np.float32)
+    unit = raw / np.linalg.norm(raw, axis=1, keepdims=True)
+    cos = unit @ unit.T
+    sq_l2 = np.maximum(
+        (raw ** 2).sum(1)[:, None] + (raw ** 2).sum(1)[None, :] - 2 * raw @ raw.T, 0.0
+    )
+    old_score = 1.0 / (1.0 + sq_l2)
+
+    same_entry = owners[:, None] == owners[None, :]
+    phrase_idx = np.flatnonzero(is_phrase)
+    positive = np.array([
+        cos[i, phrase_idx[owners[i]]] for i in range(len(texts)) if not is_phrase[i]
+    ])
+    negative = np.where(same_entry, -np.inf, cos).max(axis=1)
+
+    print(f"{len(corrections)} entries, {len(texts)} variants")
+    print(f"Norma embedding mentah: {_percentiles(np.linalg.norm(raw, axis=1))}")
+    print(f"Positif (kesalahan vs frasa benar): {_percentiles(positive)}")
+    print(f"Negatif (varian terdekat entri lain): {_percentiles(negative)}")
+
+    # Ambang cosine yang setara dengan gerbang lama pada pasangan yang sebenarnya
+    off_diag = ~np.eye(len(texts), dtype=bool)
+    for old in (0.7, 0.3):
+        passed = cos[off_diag & (old_score >= old)]
+        if passed.size:
+            print(f"Skor lama >= {old}: {passed.size} pasangan, cosine minimum {passed.min():.3f}")
+        else:
+            print(f"Skor lama >= {old}: tidak ada pasangan")
+
+    direct = min(1.0, float(negative.max()) + _MARGIN)
+    recall = float((positive >= direct).mean())
+    print(f"\nSaran DIRECT_MATCH_THRESHOLD={direct:.2f} "
+          f"(negatif maks + {_MARGIN}; {recall:.0%} kesalahan umum lolos)")
+    print(f"Saran SIMILARITY_THRESHOLD={np.percentile(positive, 5):.2f} (p5 positif)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
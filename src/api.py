@@ -1,14 +1,17 @@
 """FastAPI REST API for STT Corrector (Backend Only)."""
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import List, Optional
-import os
+from pathlib import Path
 
-from src.corrector import get_corrector
+from src.corrector import STTCorrector, preload_all
 from config import config
 
+# Lokasi knowledge base, di-resolve sekali saat import
+_KB_PATH = Path(__file__).resolve().parent.parent / "data" / "knowledge_base.json"
+
 
 # Pydantic models
 class CorrectionRequest(BaseModel):
@@ -60,13 +63,22 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     """Initialize corrector and load knowledge base on startup."""
-    corrector = get_corrector()
-    kb_path = os.path.join(os.path.dirname(__file__), "..", "data", "knowledge_base.json")
-    if os.path.exists(kb_path):
-        corrector.load_knowledge_base(kb_path)
+    corrector = preload_all()
+    app.state.corrector = corrector
+    if _KB_PATH.exists():
+        corrector.load_knowledge_base(str(_KB_PATH))
+    
+    # Warm up encoder dan koneksi LLM supaya request pertama tidak kena cold start
+    corrector.vector_store.search("warmup", top_k=1)
+    corrector.check_llm_connection()
     print("✓ STT Corrector API ready")
 
 
+def get_app_corrector(request: Request) -> STTCorrector:
+    """Dependency returning the corrector created at startup."""
+    return request.app.state.corrector
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -84,17 +96,19 @@ async def health_check():
 
 
 @app.get("/stats")
-async def get_stats():
+def get_stats(corrector: STTCorrector = Depends(get_app_corrector)):
     """Get system statistics."""
-    corrector = get_corrector()
+    # Sync handler: ping LLM bersifat blocking, jadi dijalankan di threadpool FastAPI
     return corrector.get_stats()
 
 
 @app.post("/correct", response_model=CorrectionResponse)
-async def correct_text(request: CorrectionRequest):
+async def correct_text(
+    request: CorrectionRequest,
+    corrector: STTCorrector = Depends(get_app_corrector)
+):
     """Correct a single STT text."""
     try:
-        corrector = get_corrector()
         result = corrector.correct(
             input_text=request.text,
             # use_llm di-hardcode True agar klien cukup mengirim {"text": "..."}
@@ -105,27 +119,35 @@ async def correct_text(request: CorrectionRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/correct/plain", response_model=PlainCorrectionResponse)
-async def correct_text_plain(request: CorrectionRequest):
+@app.post(
+    "/correct/plain",
+    response_model=PlainCorrectionResponse
+)
+async def correct_text_plain(
+    request: CorrectionRequest,
+    corrector: STTCorrector = Depends(get_app_corrector)
+):
     try:
-        corrector = get_corrector()
         # Gunakan mode n-gram supaya hanya frasa salah dengar yang diganti
         result = corrector.correct_in_text(
             input_text=request.text,
             # Selalu gunakan LLM untuk normalisasi akhir
             use_llm=True,
         )
-        return PlainCorrectionResponse(corrected_text=result["corrected_text"])
+        # Dict biasa: FastAPI menserialisasi lewat response_model (pydantic-core)
+        return {"corrected_text": result["corrected_text"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/correct/batch")
-async def correct_batch(request: BatchCorrectionRequest):
+async def correct_batch(
+    request: BatchCorrectionRequest,
+    corrector: STTCorrector = Depends(get_app_corrector)
+):
     """Correct multiple STT texts."""
     try:
-        corrector = get_corrector()
-        results = corrector.correct_batch(
+        results = await corrector.correct_batch_async(
             texts=request.texts,
             use_llm=request.use_llm
         )
@@ -135,10 +157,12 @@ async def correct_batch(request: BatchCorrectionRequest):
 
 
 @app.post("/knowledge/add")
-async def add_correction(request: AddCorrectionRequest):
+async def add_correction(
+    request: AddCorrectionRequest,
+    corrector: STTCorrector = Depends(get_app_corrector)
+):
     """Add a new correction to the knowledge base."""
     try:
-        corrector = get_corrector()
         doc_id = corrector.add_correction(
             correct_phrase=request.correct_phrase,
             common_mistakes=request.common_mistakes,
@@ -151,12 +175,10 @@ async def add_correction(request: AddCorrectionRequest):
 
 
 @app.post("/knowledge/reload")
-async def reload_knowledge_base():
+async def reload_knowledge_base(corrector: STTCorrector = Depends(get_app_corrector)):
     """Reload the knowledge base from file."""
     try:
-        corrector = get_corrector()
-        kb_path = os.path.join(os.path.dirname(__file__), "..", "data", "knowledge_base.json")
-        count = corrector.load_knowledge_base(kb_path)
+        count = corrector.load_knowledge_base(str(_KB_PATH))
         return {"success": True, "loaded_entries": count}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,21 +1,199 @@
 """Main STT Corrector RAG module."""
 
+import asyncio
+import copy
 import json
 import logging
 import re
-import urllib.error
-import urllib.request
-from typing import Dict, Any, List, Optional
-
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+from src import http_client
+from src.embeddings import get_embedding_model
 from src.vector_store import get_vector_store, VectorStore
 from config import config
 
+# Nilai config yang dipakai di hot path, dibaca sekali saat import
+_DIRECT_THRESHOLD: float = float(config.DIRECT_MATCH_THRESHOLD)
+_TOP_K: int = int(config.TOP_K_RESULTS)
+_LLM_REQUIRE_CANDIDATES: bool = bool(config.LLM_REQUIRE_CANDIDATES)
+_LLM_MAX_CONCURRENCY: int = max(1, int(config.LLM_MAX_CONCURRENCY))
+_CACHE_SIZE: int = int(config.CORRECTION_CACHE_SIZE)
+
+_TOKEN_RE = re.compile(r"\S+")
+_QUOTED_RE = re.compile(r"^([\"'])(.*)\1$", re.DOTALL)
+_PUNCT_RE = re.compile(r"[^\w\s-]")
+_TRAILING_PUNCT_RE = re.compile(r"[^\w\s-]+$")
+
+
+# Bagian statis prompt LLM, dirakit sekali saat import (bukan per panggilan)
+_PROMPT_HEAD: str = "\n".join([
+    "Kamu adalah sistem koreksi ejaan untuk teks speech-to-text bahasa Indonesia.",
+    "",
+    "ATURAN PENTING:",
+    "- HANYA perbaiki kata yang jelas typo atau salah dengar",
+    "- JANGAN tambah kata baru yang tidak ada di input",
+    "- JANGAN hapus kata apapun dari input - semua kata harus tetap ada dalam output (meskipun dikoreksi)",
+    "- JANGAN ganti kata dengan kata lain yang mengubah makna kalimat",
+    "- JANGAN ubah struktur kalimat atau urutan kata",
+    "- JANGAN ubah bahasa gaul/slang ke bahasa baku",
+    "- JANGAN ubah kata yang sudah benar atau sudah jelas maknanya (contoh: 'mimpin' tetap 'mimpin', JANGAN diubah)",
+    "- BOLEH memperbaiki kapitalisasi dan spasi yang salah (misalnya 'kitMulai' → 'kita mulai')",
+    "- KHUSUS untuk istilah/\"Frasa benar\" dari knowledge base, gunakan PERSIS seperti tertulis",
+    "- Koreksi harus minimal: hanya perbaiki huruf/ejaan, kapitalisasi, dan spasi yang salah",
+    "- OUTPUT: Hanya tulis teks hasil koreksi, TANPA label, TANPA penjelasan",
+    "",
+    "POLA KESALAHAN UMUM:",
+    "- Huruf hilang: 'say' → 'saya', 'kit' → 'kita', 'bso' → 'baso', 'beso' → 'besok', 'tida' → 'tidak'",
+    "- Salah dengar: 'k' → 'ke', 'kmarin' → 'kemarin', 'gmana' → 'gimana'",
+    "- Singkatan lisan: 'bru' → 'baru', 'org' → 'orang', 'tgl' → 'tanggal'",
+    "- Spasi/kapitalisasi: 'kitMulai' → 'kita mulai', 'kitaMulai' → 'kita mulai'",
+])
+
+_PROMPT_CANDIDATES_HEADER: str = "\n".join([
+    "",
+    "",
+    "ISTILAH KHUSUS yang mungkin salah dengar:",
+    "Gunakan FRASA BENAR persis seperti tertulis, jangan diubah penulisannya (huruf besar/kecil, spasi, tanda hubung).",
+    "",
+])
+
+_PROMPT_TAIL: str = "\n".join([
+    "",
+    "",
+    "===== BAHASA GAUL YANG HARUS DIPERTAHANKAN =====",
+    "PENTING: Jika menemukan kata berikut, KOREKSI KE BENTUK GAUL, BUKAN KE BAHASA BAKU:",
+    "- 'gua', 'guwe', 'gwe' → 'gue' (BUKAN 'saya' atau 'aku')",
+    "- 'lo', 'luh', 'luw', 'loe' → 'lu' (BUKAN 'kamu' atau 'Anda')",
+    "- Kata seperti 'bokap', 'nyokap', 'cuy', 'bro', 'santuy' TETAP dipertahankan",
+    "",
+    "===== CONTOH POLA KOREKSI =====",
+    "Perbaiki huruf/ejaan, kapitalisasi, dan spasi yang salah; jangan ganti makna kalimat:",
+    "",
+    "'say' → 'saya' (huruf 'a' hilang)",
+    "'kit' → 'kita' (huruf 'a' hilang)",
+    "'beso' → 'besok' (huruf 'k' hilang)",
+    "'kmarin' → 'kemarin' (huruf 'e' hilang)",
+    "'gmana' → 'gimana' (huruf 'i' hilang)",
+    "'dgan' → 'dengan' (huruf 'en' hilang)",
+    "'bru' → 'baru' (huruf 'a' hilang)",
+    "'kitMulai' → 'kita mulai' (spasi + huruf)",
+    "'gua' → 'gue' (BUKAN 'aku')",
+    "'lo' → 'lu' (BUKAN 'kamu')",
+    "'mimpin' → 'mimpin' (sudah benar, JANGAN diubah)",
+    "",
+    "Contoh kalimat:",
+    "'kmarin kit rapat dgan manajer' → 'kemarin kita rapat dengan manajer'",
+    "'beso kitaMulai pelatihan nek ji, tida di kantor' → 'besok kita mulai pelatihan Next-G tidak di kantor'",
+    "'gua yang mimpin, lo yang bantu' → 'gue yang mimpin, lu yang bantu'",
+    "",
+    "INGAT: Semua kata dalam input harus ada dalam output (meskipun dikoreksi ejaannya)!",
+    "INGAT: 'gua'→'gue' (BUKAN 'aku'), 'lo'→'lu' (BUKAN 'kamu')!",
+    "",
+    "===== TUGAS KAMU =====",
+    "",
+    "",
+])
+
+
+def _build_prompt(input_text: str, candidates_text: str) -> str:
+    """Assemble the normalization prompt around the precomputed static parts."""
+    return f"{_PROMPT_HEAD}{candidates_text}{_PROMPT_TAIL}Teks: {input_text}\nKoreksi:"
+
+
+@lru_cache(maxsize=None)
+def _llm_request_template(backend: str) -> Optional[Tuple[str, bytes, str]]:
+    """Static (url, JSON body prefix, response key) for an LLM backend.
+    
+    The body prefix is everything except the prompt, which callers append
+    as ``json.dumps(prompt)`` followed by the closing brace.
+    """
+    # === Backend: Ollama ===
+    if backend == "ollama":
+        base_url = getattr(config, "OLLAMA_BASE_URL", "http://localhost:11434")
+        model_name = getattr(config, "LLM_MODEL", "llama3.2:latest")
+        
+        payload = {
+            "model": model_name,
+            "stream": False,
+            "keep_alive": getattr(config, "LLM_KEEP_ALIVE", "30m"),
+            "options": {
+                "temperature": 0.05,
+                "top_p": 0.1,
+                "num_predict": 150,
+            },
+        }
+        url = f"{base_url.rstrip('/')}/api/generate"
+        response_key = "response"
+    
+    # === Backend: llama.cpp ===
+    elif backend == "llama_cpp":
+        base_url = getattr(config, "LLAMA_CPP_URL", "http://localhost:8080")
+        
+        payload = {
+            "n_predict": 150,
+            "temperature": 0.05,
+            "top_p": 0.1,
+            "stop": ["\n\n", "Teks:", "==="],  # Stop tokens
+        }
+        # llama.cpp server biasanya pakai /completion
+        url = f"{base_url.rstrip('/')}/completion"
+        response_key = "content"
+    
+    else:
+        return None
+    
+    body_prefix = json.dumps(payload)[:-1] + ', "prompt": '
+    return url, body_prefix.encode("utf-8"), response_key
+
+
+@lru_cache(maxsize=1024)
+def _phrase_pattern(phrases: Tuple[str, ...]) -> "re.Pattern[str]":
+    """One case-insensitive alternation for all phrases (longest first)."""
+    ordered = sorted(phrases, key=len, reverse=True)
+    return re.compile("|".join(re.escape(phrase) for phrase in ordered), re.IGNORECASE)
+
+
+def _restore_phrase_casing(text: str, candidates: List[Dict[str, Any]]) -> str:
+    """Rewrite every case-insensitive occurrence of a KB phrase with its exact casing."""
+    phrase_map: Dict[str, str] = {}
+    for candidate in candidates:
+        phrase = candidate["correct_phrase"]
+        if phrase:
+            phrase_map.setdefault(phrase.lower(), phrase)
+    if not phrase_map:
+        return text
+    
+    pattern = _phrase_pattern(tuple(sorted(phrase_map.values())))
+    return pattern.sub(lambda m: phrase_map.get(m.group().lower(), m.group()), text)
+
+
+def _select_windows(starts: List[int], size: int, used_mask: int) -> Tuple[set, int]:
+    """Greedily pick non-overlapping windows of one size, left to right.
+
+    ``starts`` must be ascending; bit ``i`` of ``used_mask`` marks token ``i`` as
+    already replaced. Returns the chosen starts and the updated mask.
+    """
+    size_mask = (1 << size) - 1
+    chosen = set()
+    for i in starts:
+        span = size_mask << i
+        if not used_mask & span:
+            chosen.add(i)
+            used_mask |= span
+    return chosen, used_mask
+
 
 class STTCorrector:
     """RAG-based Speech-to-Text Corrector."""
     
     def __init__(self):
         self.vector_store: VectorStore = get_vector_store()
+        # Cache hasil correct(): (input_text, use_llm, top_k) -> result
+        self._correct_cache: "OrderedDict[Tuple[str, bool, int], Dict[str, Any]]" = OrderedDict()
     
     def correct(
         self,
@@ -34,12 +212,38 @@ class STTCorrector:
         Returns:
             Dictionary with correction results
         """
+        top_k = top_k or _TOP_K
+        cache_key = (input_text, use_llm, top_k)
+        cached = self._correct_cache.get(cache_key)
+        if cached is not None:
+            self._correct_cache.move_to_end(cache_key)
+            return copy.copy(cached)
+        
         # Step 1: Retrieve relevant corrections from knowledge base
         candidates = self.vector_store.search(
             query=input_text,
-            top_k=top_k or config.TOP_K_RESULTS
+            top_k=top_k
         )
         
+        result, llm_failed = self._correct_with_candidates(input_text, candidates, use_llm)
+        
+        # Hasil saat LLM gagal (timeout, server mati) tidak di-cache supaya dicoba lagi
+        if _CACHE_SIZE > 0 and not llm_failed:
+            self._correct_cache[cache_key] = copy.copy(result)
+            if len(self._correct_cache) > _CACHE_SIZE:
+                self._correct_cache.popitem(last=False)
+        return result
+    
+    def _correct_with_candidates(
+        self,
+        input_text: str,
+        candidates: List[Dict[str, Any]],
+        use_llm: bool
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Apply direct-match / LLM correction given already retrieved candidates.
+        
+        Returns the result and whether an LLM call was made but produced no text.
+        """
         result = {
             "input_text": input_text,
             "corrected_text": input_text,
@@ -49,52 +253,50 @@ class STTCorrector:
         }
         
         if not candidates:
-            if use_llm:
+            if use_llm and not _LLM_REQUIRE_CANDIDATES:
                 llm_text = self._call_llm_normalize(input_text, [])
-                if llm_text:
-                    result["corrected_text"] = llm_text
-                    result["correction_made"] = llm_text != input_text
-                    result["method"] = "llm"
-            return result
+                if not llm_text:
+                    return result, True
+                result["corrected_text"] = llm_text
+                result["correction_made"] = llm_text != input_text
+                result["method"] = "llm"
+            return result, False
         
         # Step 2: Check for high-confidence direct match (berbasis similarity embedding)
         best_match = candidates[0]
-        direct_threshold = getattr(config, "DIRECT_MATCH_THRESHOLD", 0.7)
 
         if not use_llm:
-            if best_match["similarity"] >= direct_threshold:
+            if best_match["similarity"] >= _DIRECT_THRESHOLD:
                 # High confidence - use direct match
                 result["corrected_text"] = best_match["correct_phrase"]
                 result["correction_made"] = True
                 result["method"] = "direct_match"
                 result["confidence"] = best_match["similarity"]
-                return result
+                return result, False
             
             # Tidak ada LLM: jika tidak lolos direct match, kembalikan teks asli
-            return result
+            return result, False
 
         base_text = input_text
-        if best_match["similarity"] >= direct_threshold:
+        if best_match["similarity"] >= _DIRECT_THRESHOLD:
             base_text = best_match["correct_phrase"]
             result["confidence"] = best_match["similarity"]
             result["method"] = "direct_match"
 
         llm_text = self._call_llm_normalize(base_text, candidates)
-        if llm_text:
-            result["corrected_text"] = llm_text
-            result["correction_made"] = llm_text != input_text
-            if result["method"] == "none":
-                result["method"] = "llm"
-            else:
-                result["method"] = "llm_with_rag"
-            
-            # Post-processing: Pastikan frasa dari knowledge base tetap exact match
-            for candidate in candidates:
-                correct_phrase = candidate["correct_phrase"]
-                pattern = re.compile(re.escape(correct_phrase), re.IGNORECASE)
-                result["corrected_text"] = pattern.sub(correct_phrase, result["corrected_text"])
+        if not llm_text:
+            return result, True
         
-        return result
+        result["corrected_text"] = llm_text
+        result["correction_made"] = llm_text != input_text
+        if result["method"] == "none":
+            result["method"] = "llm"
+        else:
+            result["method"] = "llm_with_rag"
+        
+        # Post-processing: Pastikan frasa dari knowledge base tetap exact match
+        result["corrected_text"] = _restore_phrase_casing(result["corrected_text"], candidates)
+        return result, False
     
     def correct_in_text(
         self,
@@ -106,7 +308,16 @@ class STTCorrector:
 
         Contoh: "tolong stat meeting jam tiga" -> "tolong start meeting jam tiga".
         """
-        tokens = input_text.split()
+        # Satu pass: token + offset (supaya spasi asli bisa dipertahankan) dan
+        # versi tanpa punctuation untuk search (sekali per token, bukan per n-gram)
+        tokens: List[str] = []
+        spans: List[Tuple[int, int]] = []
+        clean_tokens: List[str] = []
+        for m in _TOKEN_RE.finditer(input_text):
+            tok = m.group()
+            tokens.append(tok)
+            spans.append(m.span())
+            clean_tokens.append(_PUNCT_RE.sub('', tok))
         if not tokens:
             return {
                 "input_text": input_text,
@@ -117,76 +328,90 @@ class STTCorrector:
             }
 
         n = len(tokens)
-        ngram_sizes = list(range(min(max_ngram, n), 0, -1))
+        max_size = min(max_ngram, n)
 
-        direct_threshold = getattr(config, "DIRECT_MATCH_THRESHOLD", 0.7)
         replacements = {}  # start_idx -> (end_idx, replacement_tokens, best_match)
-        used_indices = set()
-
-        # Cari n-gram yang mirip dengan entri di knowledge base
-        for size in ngram_sizes:
-            if size <= 0:
+        # Bitmask posisi token yang sudah diganti (bit ke-i = token ke-i)
+        used_mask = 0
+        full_mask = (1 << n) - 1
+
+        # Cari per ukuran n-gram, terpanjang dulu. Window yang tumpang tindih dengan
+        # replacement dari ukuran yang lebih panjang tidak di-embed maupun di-search.
+        for size in range(max_size, 0, -1):
+            size_mask = (1 << size) - 1
+            # Lewati window yang sudah termasuk dalam replacement lain
+            starts = [i for i in range(n - size + 1) if not (used_mask >> i) & size_mask]
+            if not starts:
                 continue
-            for i in range(0, n - size + 1):
-                # Lewati jika posisi ini sudah termasuk dalam replacement lain
-                if any(idx in used_indices for idx in range(i, i + size)):
-                    continue
-
-                # Strip punctuation dari token untuk search
-                clean_tokens = [re.sub(r'[^\w\s-]', '', tok) for tok in tokens[i : i + size]]
-                phrase = " ".join(clean_tokens)
-                
-                candidates = self.vector_store.search(query=phrase, top_k=1)
+            phrases = [" ".join(clean_tokens[i : i + size]) for i in starts]
+            phrases_lower = [phrase.lower() for phrase in phrases]
+
+            # Prefilter trigram: n-gram tanpa satu pun trigram yang ada di KB tidak perlu di-embed
+            plausible = [q for q, ok in enumerate(self.vector_store.may_match(phrases_lower)) if ok]
+
+            # Frasa yang muncul berulang cukup dicari sekali: satu batch per ukuran
+            unique_phrases = list(dict.fromkeys(phrases[q] for q in plausible))
+            found = dict(zip(
+                unique_phrases,
+                self.vector_store.search_batch(queries=unique_phrases, top_k=1),
+            ))
+
+            # Kandidat valid per window (kerja string/threshold tetap di sini)
+            accepted = []
+            for q in plausible:
+                candidates = found[phrases[q]]
                 if not candidates:
                     continue
 
                 best = candidates[0]
-                if best["similarity"] < direct_threshold:
+                if best["similarity"] < _DIRECT_THRESHOLD:
                     continue
 
-                correct_phrase = best["correct_phrase"]
                 # Jika sudah sama (case-insensitive), tidak perlu diganti
-                if correct_phrase.lower() == phrase.lower():
+                if best["correct_phrase"].lower() == phrases_lower[q]:
                     continue
+                accepted.append((starts[q], best))
+
+            # Pilih n-gram secara greedy (urut posisi, tidak saling tumpang tindih)
+            chosen, used_mask = _select_windows([i for i, _ in accepted], size, used_mask)
+            for i, best in accepted:
+                if i in chosen:
+                    # Daftarkan replacement untuk n-gram ini
+                    replacements[i] = (i + size, best["correct_phrase"].split(), best)
 
-                # Daftarkan replacement untuk n-gram ini
-                replacement_tokens = correct_phrase.split()
-                replacements[i] = (i + size, replacement_tokens, best)
-                for idx in range(i, i + size):
-                    used_indices.add(idx)
+            # Semua token sudah tertutup replacement: sisa n-gram pasti tumpang tindih
+            if used_mask == full_mask:
+                break
 
         # Jika tidak ada replacement, fallback ke koreksi berbasis kalimat penuh
         if not replacements:
             base = self.correct(input_text=input_text, use_llm=use_llm)
             return base
 
-        # Bangun kembali teks dengan replacement
-        corrected_tokens: List[str] = []
-        i = 0
+        # Bangun kembali teks dengan replacement, menyalin teks asli di antara token
+        pieces: List[str] = []
+        prev_end = 0
         applied_candidates: List[Dict[str, Any]] = []
 
-        while i < n:
-            if i in replacements:
-                end_idx, rep_tokens, best = replacements[i]
-                # Ambil punctuation dari token terakhir yang diganti
-                last_token_orig = tokens[end_idx - 1]
-                trailing_punct = re.findall(r'[^\w\s-]+$', last_token_orig)
-                
-                # Tambahkan replacement tokens
-                corrected_tokens.extend(rep_tokens[:-1] if len(rep_tokens) > 1 else [])
-                # Token terakhir + punctuation asli
-                last_rep = rep_tokens[-1] if rep_tokens else ""
-                if trailing_punct:
-                    last_rep += trailing_punct[0]
-                corrected_tokens.append(last_rep)
-                
-                applied_candidates.append(best)
-                i = end_idx
-            else:
-                corrected_tokens.append(tokens[i])
-                i += 1
+        for i in sorted(replacements):
+            end_idx, rep_tokens, best = replacements[i]
+            # Ambil punctuation dari token terakhir yang diganti
+            last_token_orig = tokens[end_idx - 1]
+            trailing_punct = _TRAILING_PUNCT_RE.search(last_token_orig)
+
+            # Replacement + punctuation asli dari token terakhir
+            replacement = " ".join(rep_tokens)
+            if trailing_punct:
+                replacement += trailing_punct.group()
 
-        corrected_text = " ".join(corrected_tokens)
+            pieces.append(input_text[prev_end:spans[i][0]])
+            pieces.append(replacement)
+            prev_end = spans[end_idx - 1][1]
+
+            applied_candidates.append(best)
+
+        pieces.append(input_text[prev_end:])
+        corrected_text = "".join(pieces)
 
         final_text = corrected_text
         method = "ngram_direct_match"
@@ -198,11 +423,7 @@ class STTCorrector:
                 
                 # Post-processing: Pastikan frasa dari knowledge base tetap exact match
                 # (LLM kadang mengubah kapitalisasi)
-                for candidate in applied_candidates:
-                    correct_phrase = candidate["correct_phrase"]
-                    # Case-insensitive replace dengan exact casing dari knowledge base
-                    pattern = re.compile(re.escape(correct_phrase), re.IGNORECASE)
-                    final_text = pattern.sub(correct_phrase, final_text)
+                final_text = _restore_phrase_casing(final_text, applied_candidates)
 
         return {
             "input_text": input_text,
@@ -212,17 +433,6 @@ class STTCorrector:
             "method": method,
         }
     
-    def _format_candidates(self, candidates: List[Dict]) -> str:
-        """Format candidates for LLM prompt."""
-        lines = []
-        for i, c in enumerate(candidates, 1):
-            mistakes = ", ".join(c["common_mistakes"][:3])
-            lines.append(
-                f"{i}. Frasa benar: \"{c['correct_phrase']}\" "
-                f"(kesalahan umum: {mistakes}) - Konteks: {c['context']}"
-            )
-        return "\n".join(lines)
-    
     def _call_llm_normalize(
         self,
         input_text: str,
@@ -231,146 +441,102 @@ class STTCorrector:
         # Pilih backend: "ollama" atau "llama_cpp"
         backend = getattr(config, "LLM_BACKEND", "ollama")
         
-        parts: List[str] = [
-            "Kamu adalah sistem koreksi ejaan untuk teks speech-to-text bahasa Indonesia.",
-            "",
-            "ATURAN PENTING:",
-            "- HANYA perbaiki kata yang jelas typo atau salah dengar",
-            "- JANGAN tambah kata baru yang tidak ada di input",
-            "- JANGAN hapus kata apapun dari input - semua kata harus tetap ada dalam output (meskipun dikoreksi)",
-            "- JANGAN ganti kata dengan kata lain yang mengubah makna kalimat",
-            "- JANGAN ubah struktur kalimat atau urutan kata",
-            "- JANGAN ubah bahasa gaul/slang ke bahasa baku",
-            "- JANGAN ubah kata yang sudah benar atau sudah jelas maknanya (contoh: 'mimpin' tetap 'mimpin', JANGAN diubah)",
-            "- BOLEH memperbaiki kapitalisasi dan spasi yang salah (misalnya 'kitMulai' → 'kita mulai')",
-            "- KHUSUS untuk istilah/\"Frasa benar\" dari knowledge base, gunakan PERSIS seperti tertulis",
-            "- Koreksi harus minimal: hanya perbaiki huruf/ejaan, kapitalisasi, dan spasi yang salah",
-            "- OUTPUT: Hanya tulis teks hasil koreksi, TANPA label, TANPA penjelasan",
-            "",
-            "POLA KESALAHAN UMUM:",
-            "- Huruf hilang: 'say' → 'saya', 'kit' → 'kita', 'bso' → 'baso', 'beso' → 'besok', 'tida' → 'tidak'",
-            "- Salah dengar: 'k' → 'ke', 'kmarin' → 'kemarin', 'gmana' → 'gimana'",
-            "- Singkatan lisan: 'bru' → 'baru', 'org' → 'orang', 'tgl' → 'tanggal'",
-            "- Spasi/kapitalisasi: 'kitMulai' → 'kita mulai', 'kitaMulai' → 'kita mulai'",
-        ]
-
         # Candidates jadi contoh belajar, bukan hardcode
+        candidates_text = ""
         if candidates:
-            parts.append("")
-            parts.append("ISTILAH KHUSUS yang mungkin salah dengar:")
-            parts.append("Gunakan FRASA BENAR persis seperti tertulis, jangan diubah penulisannya (huruf besar/kecil, spasi, tanda hubung).")
-            # Ambil max 5-10 contoh teratas aja
-            top_candidates = candidates[:10] if len(candidates) > 10 else candidates
-            parts.append(self._format_candidates(top_candidates))
-
-        parts.append("")
-        parts.append("===== BAHASA GAUL YANG HARUS DIPERTAHANKAN =====")
-        parts.append("PENTING: Jika menemukan kata berikut, KOREKSI KE BENTUK GAUL, BUKAN KE BAHASA BAKU:")
-        parts.append("- 'gua', 'guwe', 'gwe' → 'gue' (BUKAN 'saya' atau 'aku')")
-        parts.append("- 'lo', 'luh', 'luw', 'loe' → 'lu' (BUKAN 'kamu' atau 'Anda')")
-        parts.append("- Kata seperti 'bokap', 'nyokap', 'cuy', 'bro', 'santuy' TETAP dipertahankan")
-        parts.append("")
-        parts.append("===== CONTOH POLA KOREKSI =====")
-        parts.append("Perbaiki huruf/ejaan, kapitalisasi, dan spasi yang salah; jangan ganti makna kalimat:")
-        parts.append("")
-        parts.append("'say' → 'saya' (huruf 'a' hilang)")
-        parts.append("'kit' → 'kita' (huruf 'a' hilang)")
-        parts.append("'beso' → 'besok' (huruf 'k' hilang)")
-        parts.append("'kmarin' → 'kemarin' (huruf 'e' hilang)")
-        parts.append("'gmana' → 'gimana' (huruf 'i' hilang)")
-        parts.append("'dgan' → 'dengan' (huruf 'en' hilang)")
-        parts.append("'bru' → 'baru' (huruf 'a' hilang)")
-        parts.append("'kitMulai' → 'kita mulai' (spasi + huruf)")
-        parts.append("'gua' → 'gue' (BUKAN 'aku')")
-        parts.append("'lo' → 'lu' (BUKAN 'kamu')")
-        parts.append("'mimpin' → 'mimpin' (sudah benar, JANGAN diubah)")
-        parts.append("")
-        parts.append("Contoh kalimat:")
-        parts.append("'kmarin kit rapat dgan manajer' → 'kemarin kita rapat dengan manajer'")
-        parts.append("'beso kitaMulai pelatihan nek ji, tida di kantor' → 'besok kita mulai pelatihan Next-G tidak di kantor'")
-        parts.append("'gua yang mimpin, lo yang bantu' → 'gue yang mimpin, lu yang bantu'")
-        parts.append("")
-        parts.append("INGAT: Semua kata dalam input harus ada dalam output (meskipun dikoreksi ejaannya)!")
-        parts.append("INGAT: 'gua'→'gue' (BUKAN 'aku'), 'lo'→'lu' (BUKAN 'kamu')!")
-        parts.append("")
-        parts.append("===== TUGAS KAMU =====")
-        parts.append("")
-        parts.append("Teks: " + input_text)
-        parts.append("Koreksi:")
-
-        prompt = "\n".join(parts)
-
-        # === Backend: Ollama ===
-        if backend == "ollama":
-            base_url = getattr(config, "OLLAMA_BASE_URL", "http://localhost:11434")
-            model_name = getattr(config, "LLM_MODEL", "llama3.2:latest")
-            
-            payload = {
-                "model": model_name,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.05,
-                    "top_p": 0.1,
-                    "num_predict": 150,
-                },
-            }
-            url = f"{base_url.rstrip('/')}/api/generate"
-            response_key = "response"
-        
-        # === Backend: llama.cpp ===
-        elif backend == "llama_cpp":
-            base_url = getattr(config, "LLAMA_CPP_URL", "http://localhost:8080")
-            
-            payload = {
-                "prompt": prompt,
-                "n_predict": 150,
-                "temperature": 0.05,
-                "top_p": 0.1,
-                "stop": ["\n\n", "Teks:", "==="],  # Stop tokens
-            }
-            # llama.cpp server biasanya pakai /completion
-            url = f"{base_url.rstrip('/')}/completion"
-            response_key = "content"
-        
-        else:
+            # Ambil max 5-10 contoh teratas aja, diformat langsung dalam satu pass
+            candidates_text = _PROMPT_CANDIDATES_HEADER + "\n".join(
+                f"{i}. Frasa benar: \"{c['correct_phrase']}\" "
+                f"(kesalahan umum: {', '.join(c['common_mistakes'][:3])}) - Konteks: {c['context']}"
+                for i, c in enumerate(candidates[:10], 1)
+            )
+
+        prompt = _build_prompt(input_text, candidates_text)
+
+        request = _llm_request_template(backend)
+        if request is None:
             logging.error(f"Unknown LLM backend: {backend}")
             return None
+        url, body_prefix, response_key = request
         
-        data = json.dumps(payload).encode("utf-8")
-
         try:
-            request_obj = urllib.request.Request(
-                url,
-                data=data,
-                headers={"Content-Type": "application/json"},
-                method="POST",
-            )
-            with urllib.request.urlopen(request_obj, timeout=30) as response:
-                raw = response.read().decode("utf-8")
-
-            resp_json = json.loads(raw)
+            # Koneksi keep-alive dipakai ulang antar panggilan (lihat src/http_client.py)
+            # Hanya prompt yang di-encode per panggilan; sisa body sudah jadi bytes
+            body = body_prefix + json.dumps(prompt).encode("utf-8") + b"}"
+            resp_json = http_client.post_body(url, body, timeout=30)
             text = resp_json.get(response_key, "").strip()
             if not text:
                 return None
 
-            if (text.startswith("\"") and text.endswith("\"")) or (
-                text.startswith("'") and text.endswith("'")
-            ):
-                text = text[1:-1].strip()
+            # Buang pasangan tanda kutip pembungkus ("..." atau '...') dalam satu match
+            quoted = _QUOTED_RE.match(text)
+            if quoted:
+                text = quoted.group(2).strip()
 
             return text
         except Exception:
             logging.exception(f"Failed to call LLM ({backend}) for normalization")
             return None
     
+    def check_llm_connection(self, timeout: float = 2.0) -> bool:
+        """Ping the configured LLM backend; also opens the connection before serving."""
+        backend = getattr(config, "LLM_BACKEND", "ollama")
+        if backend == "ollama":
+            base_url = getattr(config, "OLLAMA_BASE_URL", "http://localhost:11434")
+            url = f"{base_url.rstrip('/')}/api/tags"
+        elif backend == "llama_cpp":
+            base_url = getattr(config, "LLAMA_CPP_URL", "http://localhost:8080")
+            url = f"{base_url.rstrip('/')}/health"
+        else:
+            return False
+
+        try:
+            return http_client.get_status(url, timeout=timeout) == 200
+        except Exception:
+            logging.warning(f"LLM backend ({backend}) is not reachable at {url}")
+            return False
+    
     def correct_batch(
         self,
         texts: List[str],
         use_llm: bool = False
     ) -> List[Dict[str, Any]]:
-        """Correct multiple STT texts."""
-        return [self.correct(text, use_llm=False) for text in texts]
+        """Correct multiple STT texts with one batched search."""
+        if use_llm:
+            # Panggilan LLM dijalankan paralel lewat versi async
+            return asyncio.run(self.correct_batch_async(texts, use_llm=True))
+        
+        all_candidates = self.vector_store.search_batch(queries=texts, top_k=_TOP_K)
+        return [
+            self._correct_with_candidates(text, candidates, use_llm)[0]
+            for text, candidates in zip(texts, all_candidates)
+        ]
+    
+    async def correct_batch_async(
+        self,
+        texts: List[str],
+        use_llm: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Correct multiple STT texts with one batched search and concurrent LLM calls."""
+        if not use_llm:
+            return self.correct_batch(texts, use_llm=False)
+        
+        all_candidates = self.vector_store.search_batch(queries=texts, top_k=_TOP_K)
+        
+        # Panggilan LLM bersifat blocking (http.client), jadi jalankan di thread pool
+        # supaya latensi tiap request ke LLM saling tumpang tindih. Jumlah request
+        # bersamaan dibatasi agar tidak melebihi kapasitas paralel server LLM.
+        semaphore = asyncio.Semaphore(_LLM_MAX_CONCURRENCY)
+        
+        async def correct_one(text: str, candidates: List[Dict[str, Any]]) -> Dict[str, Any]:
+            async with semaphore:
+                result, _ = await asyncio.to_thread(self._correct_with_candidates, text, candidates, True)
+                return result
+        
+        return list(await asyncio.gather(*[
+            correct_one(text, candidates)
+            for text, candidates in zip(texts, all_candidates)
+        ]))
     
     def add_correction(
         self,
@@ -380,6 +546,7 @@ class STTCorrector:
         category: str = ""
     ) -> str:
         """Add a new correction to the knowledge base."""
+        self._correct_cache.clear()
         return self.vector_store.add_correction(
             correct_phrase=correct_phrase,
             common_mistakes=common_mistakes,
@@ -389,6 +556,7 @@ class STTCorrector:
     
     def load_knowledge_base(self, filepath: str) -> int:
         """Load corrections from JSON file."""
+        self._correct_cache.clear()
         return self.vector_store.load_knowledge_base(filepath)
     
     def get_stats(self) -> Dict[str, Any]:
@@ -400,19 +568,54 @@ class STTCorrector:
             "llm_backend": backend,
             "llm_model": getattr(config, "LLM_MODEL", None) if backend == "ollama" else None,
             "llama_cpp_url": getattr(config, "LLAMA_CPP_URL", None) if backend == "llama_cpp" else None,
-            # Untuk kompatibilitas dengan scripts/test_corrector.py
-            # Saat ini belum ada pengecekan koneksi nyata, jadi diset False secara default
-            "llm_connected": False,
+            # Ping singkat ke backend LLM (GET /api/tags atau /health)
+            "llm_connected": self.check_llm_connection(),
         }
 
 
 # Singleton instance
 _corrector = None
+_corrector_lock = threading.Lock()
 
 
 def get_corrector() -> STTCorrector:
     """Get or create singleton corrector instance."""
     global _corrector
     if _corrector is None:
-        _corrector = STTCorrector()
+        with _corrector_lock:
+            if _corrector is None:
+                _corrector = STTCorrector()
     return _corrector
+
+
+def preload_all() -> STTCorrector:
+    """Eagerly create every singleton, loading the encoder and ChromaDB in parallel."""
+    if config.LLM_WARMUP:
+        # Muat model LLM di background, paralel dengan sisa startup
+        threading.Thread(target=_warmup_llm, name="llm-warmup", daemon=True).start()
+    
+    # Encoder dan client ChromaDB dimuat bersamaan
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="preload") as pool:
+        futures = [pool.submit(get_embedding_model), pool.submit(get_vector_store)]
+        for future in futures:
+            future.result()
+    return get_corrector()
+
+
+def _warmup_llm(timeout: float = 120.0):
+    """Ask Ollama to load the model into memory without generating anything."""
+    # llama.cpp server sudah memuat model saat start, jadi hanya Ollama yang perlu
+    if getattr(config, "LLM_BACKEND", "ollama") != "ollama":
+        return
+    
+    base_url = getattr(config, "OLLAMA_BASE_URL", "http://localhost:11434")
+    url = f"{base_url.rstrip('/')}/api/generate"
+    # Request tanpa prompt = hanya load model (dan set keep_alive)
+    payload = {
+        "model": getattr(config, "LLM_MODEL", "llama3.2:latest"),
+        "keep_alive": getattr(config, "LLM_KEEP_ALIVE", "30m"),
+    }
+    try:
+        http_client.post_json(url, payload, timeout=timeout)
+    except Exception as e:
+        logging.warning(f"LLM warmup failed ({url}): {e}")
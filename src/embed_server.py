@@ -0,0 +1,59 @@
+"""Standalone embedding server shared by all API worker processes.
+
+Jalankan sekali: ``python -m src.embed_server``, lalu set
+``EMBEDDING_SERVER_URL=http://localhost:8001`` untuk worker API.
+"""
+
+from typing import List, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, Response
+from pydantic import BaseModel, Field
+
+from config import config
+from src.embeddings import EmbeddingModel
+
+
+class EncodeRequest(BaseModel):
+    texts: List[str] = Field(..., description="Teks yang akan di-encode")
+    model: Optional[str] = Field(None, description="Nama model yang diharapkan client")
+
+
+app = FastAPI(
+    title="STT Corrector Embedding Server",
+    description="Encode teks dengan SentenceTransformer untuk semua worker API",
+    version="1.0.0"
+)
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Load the model once for this process."""
+    # Selalu encode di proses ini, walaupun EMBEDDING_SERVER_URL ikut di-set di .env
+    app.state.model = EmbeddingModel(server_url="")
+
+
+@app.post("/encode")
+def encode(payload: EncodeRequest, request: Request) -> Response:
+    """Encode texts; the body is row-major float16 of shape [len(texts), dim]."""
+    model: EmbeddingModel = request.app.state.model
+    if payload.model and payload.model != model.model_name:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Server memuat model {model.model_name}, bukan {payload.model}"
+        )
+    
+    vectors = model.embed_texts(payload.texts).astype(np.float16)
+    return Response(content=vectors.tobytes(), media_type="application/octet-stream")
+
+
+@app.get("/stats")
+def get_stats(request: Request):
+    """Get model name and embedding cache statistics."""
+    model: EmbeddingModel = request.app.state.model
+    return {"model": model.model_name, "embedding_cache": model.get_stats()}
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=config.HOST, port=config.EMBEDDING_SERVER_PORT)
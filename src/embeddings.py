@@ -1,46 +1,153 @@
 """Embedding module using SentenceTransformers."""
 
-from sentence_transformers import SentenceTransformer
-from typing import List
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 import numpy as np
 
 from config import config
+from src import http_client
 
 
 class EmbeddingModel:
-    """Wrapper for SentenceTransformer embedding model."""
+    """Wrapper for SentenceTransformer embedding model (L2-normalized outputs)."""
     
-    def __init__(self, model_name: str = None):
+    def __init__(self, model_name: str = None, server_url: Optional[str] = None):
         self.model_name = model_name or config.EMBEDDING_MODEL
-        self.model = SentenceTransformer(self.model_name)
-        print(f"✓ Embedding model loaded: {self.model_name}")
+        # URL server embedding (None = pakai config, "" = selalu encode di proses ini)
+        self.server_url = config.EMBEDDING_SERVER_URL if server_url is None else server_url
+        self.backend = config.EMBEDDING_BACKEND
+        if self.server_url:
+            # Mode client: model hanya dimuat sekali di proses embed_server
+            self.model = None
+        else:
+            self.model, self.backend = _load_sentence_transformer(self.model_name, self.backend)
+        
+        # Identitas embedding (model + backend non-torch): dipakai untuk cache key dan
+        # metadata KB, karena model terkuantisasi menghasilkan vektor yang sedikit berbeda
+        self.model_id = self.model_name
+        if self.backend != "torch":
+            self.model_id += f"#{self.backend}"
+            if config.EMBEDDING_MODEL_FILE:
+                self.model_id += f":{config.EMBEDDING_MODEL_FILE}"
+        
+        # LRU cache embedding: sha256(model_id + text) -> vektor float32
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._cache_size = config.EMBEDDING_CACHE_SIZE
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        if self.server_url:
+            print(f"✓ Embedding server: {self.server_url} ({self.model_name})")
+        else:
+            print(f"✓ Embedding model loaded: {self.model_name} ({self.backend})")
+    
+    def _cache_key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode("utf-8")).digest()
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts to an [N, d] array, only running the model on cache misses."""
+        keys = [self._cache_key(text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    vectors[i] = cached
+            missing = [i for i, vec in enumerate(vectors) if vec is None]
+            self._cache_hits += len(texts) - len(missing)
+            self._cache_misses += len(missing)
+        
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            if self.server_url:
+                encoded = self._encode_remote(missing_texts)
+            else:
+                encoded = self.model.encode(
+                    missing_texts,
+                    batch_size=config.EMBEDDING_BATCH_SIZE,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True
+                ).astype(np.float32, copy=False)
+            
+            with self._cache_lock:
+                for row, i in enumerate(missing):
+                    vectors[i] = encoded[row]
+                    if self._cache_size > 0:
+                        self._cache[keys[i]] = encoded[row]
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(vectors)
+    
+    def _encode_remote(self, texts: List[str]) -> np.ndarray:
+        """Encode texts on the embedding server (float16 over the wire)."""
+        raw = http_client.post_json_raw(
+            f"{self.server_url.rstrip('/')}/encode",
+            {"model": self.model_name, "texts": texts},
+            timeout=30.0
+        )
+        return np.frombuffer(raw, dtype=np.float16).reshape(len(texts), -1).astype(np.float32)
     
-    def embed_text(self, text: str) -> List[float]:
-        """Generate embedding for a single text."""
-        embedding = self.model.encode(text, convert_to_numpy=True)
-        return embedding.tolist()
+    def embed_text(self, text: str) -> np.ndarray:
+        """Generate embedding for a single text as a float32 array of shape (d,)."""
+        return self._encode([text])[0]
     
-    def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for multiple texts."""
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings.tolist()
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Generate embeddings for multiple texts as a float32 array of shape (N, d)."""
+        return self._encode(texts)
     
     def compute_similarity(self, text1: str, text2: str) -> float:
         """Compute cosine similarity between two texts."""
-        emb1 = np.array(self.model.encode(text1))
-        emb2 = np.array(self.model.encode(text2))
+        emb1, emb2 = self._encode([text1, text2])
         
-        cosine_sim = np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
-        return float(cosine_sim)
+        # Embedding sudah unit-length, jadi cosine = dot product
+        return float(np.dot(emb1, emb2))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get embedding cache statistics."""
+        with self._cache_lock:
+            return {
+                "cache_size": len(self._cache),
+                "cache_max_size": self._cache_size,
+                "cache_hits": self._cache_hits,
+                "cache_misses": self._cache_misses,
+            }
+
+
+def _load_sentence_transformer(model_name: str, backend: str) -> Tuple[Any, str]:
+    """Load a SentenceTransformer, falling back to torch if the requested backend fails."""
+    # Import di sini supaya worker mode client tidak perlu memuat torch
+    from sentence_transformers import SentenceTransformer
+    
+    if backend in ("onnx", "openvino"):
+        model_kwargs = {"file_name": config.EMBEDDING_MODEL_FILE} if config.EMBEDDING_MODEL_FILE else None
+        try:
+            return SentenceTransformer(model_name, backend=backend, model_kwargs=model_kwargs), backend
+        except Exception:
+            logging.exception(f"Failed to load {backend} backend for {model_name}, falling back to torch")
+    elif backend != "torch":
+        logging.error(f"Unknown embedding backend: {backend}, using torch")
+    return SentenceTransformer(model_name), "torch"
 
 
 # Singleton instance
 _embedding_model = None
+_embedding_model_lock = threading.Lock()
 
 
 def get_embedding_model() -> EmbeddingModel:
     """Get or create singleton embedding model instance."""
     global _embedding_model
     if _embedding_model is None:
-        _embedding_model = EmbeddingModel()
+        # Double-checked locking: model hanya dimuat sekali walau dipanggil paralel
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                _embedding_model = EmbeddingModel()
     return _embedding_model
@@ -0,0 +1,138 @@
+"""Keep-alive HTTP helpers for calls to the LLM backend."""
+
+import http.client
+import json
+import queue
+import threading
+import urllib.error
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from config import config
+
+# Pool koneksi keep-alive per (scheme, host), dipakai bersama oleh semua thread
+_pools: Dict[Tuple[str, str], "queue.LifoQueue[http.client.HTTPConnection]"] = {}
+_pools_lock = threading.Lock()
+
+
+def _split_url(url: str) -> Tuple[str, str, str]:
+    """Split a URL into (scheme, netloc, path-with-query)."""
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return parts.scheme, parts.netloc, path
+
+
+def _get_pool(scheme: str, netloc: str) -> "queue.LifoQueue[http.client.HTTPConnection]":
+    with _pools_lock:
+        pool = _pools.get((scheme, netloc))
+        if pool is None:
+            pool = _pools[(scheme, netloc)] = queue.LifoQueue(maxsize=config.HTTP_POOL_SIZE)
+        return pool
+
+
+def _new_connection(scheme: str, netloc: str, timeout: float) -> http.client.HTTPConnection:
+    conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+    return conn_cls(netloc, timeout=timeout)
+
+
+def _flush_pool(scheme: str, netloc: str):
+    """Close every idle connection to a host (they are likely stale as well)."""
+    pool = _get_pool(scheme, netloc)
+    while True:
+        try:
+            pool.get_nowait().close()
+        except queue.Empty:
+            return
+
+
+def _acquire(scheme: str, netloc: str, timeout: float) -> http.client.HTTPConnection:
+    """Take an idle connection from the pool (most recently used first) or open a new one."""
+    try:
+        conn = _get_pool(scheme, netloc).get_nowait()
+    except queue.Empty:
+        conn = _new_connection(scheme, netloc, timeout)
+
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    return conn
+
+
+def _release(scheme: str, netloc: str, conn: http.client.HTTPConnection):
+    """Return a connection to the pool, closing it if the pool is already full."""
+    try:
+        _get_pool(scheme, netloc).put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def _send(
+    conn: http.client.HTTPConnection,
+    method: str,
+    url: str,
+    body: Optional[bytes]
+) -> Tuple[int, bytes]:
+    """Send one request over the given connection; close it on any failure."""
+    scheme, netloc, path = _split_url(url)
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        raw = response.read()
+    except Exception:
+        conn.close()
+        raise
+
+    if response.will_close:
+        conn.close()
+    else:
+        _release(scheme, netloc, conn)
+    if response.status >= 400:
+        raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+    return response.status, raw
+
+
+def _request(
+    method: str,
+    url: str,
+    body: Optional[bytes],
+    timeout: float
+) -> Tuple[int, bytes]:
+    """Send a request over a pooled connection; retry once if the socket went stale."""
+    scheme, netloc, _ = _split_url(url)
+    conn = _acquire(scheme, netloc, timeout)
+    reused = conn.sock is not None
+    try:
+        return _send(conn, method, url, body)
+    except (ConnectionError, http.client.HTTPException):
+        # Server menutup koneksi idle: koneksi idle lain di pool kemungkinan juga
+        # sudah mati, jadi kosongkan pool dan coba sekali lagi dengan koneksi baru
+        if not reused:
+            raise
+        _flush_pool(scheme, netloc)
+    return _send(_new_connection(scheme, netloc, timeout), method, url, body)
+
+
+def post_json(url: str, payload: Dict[str, Any], timeout: float = 30.0) -> Dict[str, Any]:
+    """POST a JSON payload and decode the JSON response."""
+    return post_body(url, json.dumps(payload).encode("utf-8"), timeout)
+
+
+def post_json_raw(url: str, payload: Dict[str, Any], timeout: float = 30.0) -> bytes:
+    """POST a JSON payload and return the undecoded response body."""
+    _, raw = _request("POST", url, json.dumps(payload).encode("utf-8"), timeout)
+    return raw
+
+
+def post_body(url: str, body: bytes, timeout: float = 30.0) -> Dict[str, Any]:
+    """POST an already-encoded JSON body and decode the JSON response."""
+    _, raw = _request("POST", url, body, timeout)
+    return json.loads(raw.decode("utf-8"))
+
+
+def get_status(url: str, timeout: float = 2.0) -> int:
+    """GET a URL and return its status code."""
+    status, _ = _request("GET", url, None, timeout)
+    return status
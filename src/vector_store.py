@@ -1,15 +1,34 @@
 """Vector store module using ChromaDB."""
 
+import hashlib
 import json
 import os
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 import chromadb
+import numpy as np
 from chromadb.config import Settings
 
 from config import config
 from src.embeddings import get_embedding_model
 
 
+# Jumlah baris KB terkuantisasi yang di-upcast sekaligus saat scoring
+_DOT_BLOCK_ROWS = 4096
+
+# Kelipatan top_k yang diambil dari matriks sebelum dedup per correct_phrase
+_SEARCH_OVERFETCH = 4
+
+# Jumlah varian yang ditulis ke ChromaDB per batch saat memuat knowledge base
+_WRITE_BATCH_ROWS = 512
+
+# Ruang jarak cosine untuk index HNSW ChromaDB (hanya berlaku untuk collection baru)
+_COLLECTION_METADATA = {
+    "description": "STT correction knowledge base",
+    "hnsw:space": "cosine",
+}
+
+
 class VectorStore:
     """ChromaDB-based vector store for STT corrections."""
     
@@ -26,10 +45,27 @@ class VectorStore:
         # Get or create collection
         self.collection = self.client.get_or_create_collection(
             name=config.COLLECTION_NAME,
-            metadata={"description": "STT correction knowledge base"}
+            metadata=_COLLECTION_METADATA
         )
         
         self.embedding_model = get_embedding_model()
+        
+        # Salinan embedding KB di memori untuk scoring dengan satu matmul (numpy/BLAS).
+        # Dibangun ulang dari collection saat pertama kali search setelah ada perubahan.
+        # Semua vektor unit-length sehingga dot product = cosine similarity.
+        self._kb_size = 0
+        self._kb_mat: Optional[np.ndarray] = None  # [N, d] float32 (atau float16)
+        # Versi int8 (per-row scale) bila KB_QUANTIZATION="int8"
+        self._kb_int8: Optional[np.ndarray] = None  # [N, d] int8
+        self._kb_scales: Optional[np.ndarray] = None  # [N] float32
+        self._kb_documents: List[str] = []
+        self._kb_metadatas: List[Dict[str, Any]] = []
+        # Trigram karakter dari semua dokumen KB (frasa benar + kesalahan umum)
+        self._kb_trigrams: frozenset = frozenset()
+        self._kb_dirty = True
+        
+        # Semantic cache per (top_k, threshold): (embedding query [M, d], hasil search)
+        self._semantic_cache: Dict[Tuple[int, float], Tuple[np.ndarray, List[List[Dict[str, Any]]]]] = {}
         print(f"✓ Vector store initialized: {config.COLLECTION_NAME}")
     
     def add_correction(
@@ -41,8 +77,21 @@ class VectorStore:
         doc_id: Optional[str] = None
     ) -> str:
         """Add a correction entry to the vector store."""
-        # Generate unique ID
-        doc_id = doc_id or f"correction_{hash(correct_phrase) % 10000}"
+        entry = self._correction_rows(correct_phrase, common_mistakes, context, category, doc_id)
+        self._write_corrections([entry])
+        return entry[0]
+    
+    def _correction_rows(
+        self,
+        correct_phrase: str,
+        common_mistakes: List[str],
+        context: str = "",
+        category: str = "",
+        doc_id: Optional[str] = None
+    ) -> Tuple[str, List[str], Dict[str, Any]]:
+        """Build (doc_id, variant texts, metadata) for one correction entry."""
+        # ID stabil antar proses (hash() bawaan Python di-salt per proses)
+        doc_id = doc_id or f"correction_{_phrase_id(correct_phrase)}"
         
         # Create searchable text combining all variants
         searchable_texts = [correct_phrase] + common_mistakes
@@ -53,22 +102,56 @@ class VectorStore:
             "common_mistakes": json.dumps(common_mistakes),
             "context": context,
             "category": category,
-            "type": "correction"
+            "type": "correction",
+            "embedding_model": self.embedding_model.model_id
         }
+        return doc_id, searchable_texts, metadata
+    
+    def _write_corrections(self, entries: List[Tuple[str, List[str], Dict[str, Any]]]):
+        """Write the variants of several entries with one get, one encode and one upsert."""
+        # Setiap varian jadi dokumen terpisah yang menunjuk ke frasa benar.
+        # ID duplikat (frasa sama dua kali): entri terakhir yang menang, seperti upsert berurutan.
+        rows: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        for doc_id, searchable_texts, metadata in entries:
+            for i, text in enumerate(searchable_texts):
+                rows[f"{doc_id}_{i}"] = (text, metadata)
+        if not rows:
+            return
         
-        # Add each variant as a separate document pointing to the correct phrase
-        for i, text in enumerate(searchable_texts):
-            variant_id = f"{doc_id}_{i}"
-            embedding = self.embedding_model.embed_text(text)
-            
+        # Varian yang teks & model embedding-nya sama dengan yang tersimpan tidak di-embed ulang
+        stored = self.collection.get(ids=list(rows), include=["documents", "metadatas"])
+        stored_by_id = {
+            sid: (doc, meta)
+            for sid, doc, meta in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        
+        stale_ids, stale_texts, stale_metas = [], [], []
+        meta_only_ids, meta_only_metas = [], []
+        for variant_id, (text, metadata) in rows.items():
+            doc, meta = stored_by_id.get(variant_id, (None, None))
+            if doc != text or (meta or {}).get("embedding_model") != metadata["embedding_model"]:
+                stale_ids.append(variant_id)
+                stale_texts.append(text)
+                stale_metas.append(metadata)
+            elif meta != metadata:
+                meta_only_ids.append(variant_id)
+                meta_only_metas.append(metadata)
+        
+        if stale_ids:
+            # Satu panggilan encoder untuk semua varian yang berubah
+            embeddings = self.embedding_model.embed_texts(stale_texts)
             self.collection.upsert(
-                ids=[variant_id],
-                embeddings=[embedding],
-                documents=[text],
-                metadatas=[metadata]
+                ids=stale_ids,
+                # ChromaDB 0.4.x hanya menerima list; konversi cukup sekali di batas penulisan
+                embeddings=embeddings.tolist(),
+                documents=stale_texts,
+                metadatas=stale_metas
             )
+        if meta_only_ids:
+            self.collection.update(ids=meta_only_ids, metadatas=meta_only_metas)
         
-        return doc_id
+        if stale_ids or meta_only_ids:
+            self._kb_dirty = True
     
     def search(
         self,
@@ -77,61 +160,194 @@ class VectorStore:
         threshold: float = None
     ) -> List[Dict[str, Any]]:
         """Search for corrections matching the query."""
+        return self.search_batch([query], top_k=top_k, threshold=threshold)[0]
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = None,
+        threshold: float = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Search for corrections matching each query with one encode + one query call."""
+        if not queries:
+            return []
+        
         top_k = top_k or config.TOP_K_RESULTS
         threshold = threshold or config.SIMILARITY_THRESHOLD
         
-        # Generate query embedding
-        query_embedding = self.embedding_model.embed_text(query)
+        self._ensure_kb_matrix()
+        if self._kb_size == 0:
+            return [[] for _ in queries]
         
-        # Search in ChromaDB
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k,
-            include=["documents", "metadatas", "distances"]
-        )
+        # Generate all query embeddings in a single batched forward pass
+        # (sudah unit-length dari EmbeddingModel)
+        query_mat = self.embedding_model.embed_texts(queries)
+        
+        # Query yang hampir identik dengan query sebelumnya memakai hasil yang di-cache
+        cache_key = (top_k, threshold)
+        all_corrections = self._semantic_cache_lookup(query_mat, cache_key)
+        pending = [q for q, cached in enumerate(all_corrections) if cached is None]
+        if not pending:
+            return all_corrections
+        pending_mat = query_mat[pending]
+        
+        # Cosine similarity terhadap seluruh KB via satu matmul
+        scores = self._kb_dot(pending_mat)
+        
+        # Over-fetch: beberapa varian bisa menunjuk ke frasa yang sama
+        k = min(top_k * _SEARCH_OVERFETCH, self._kb_size)
+        top_idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
         
         # Process results
-        corrections = []
-        seen_phrases = set()
-        
-        if results["ids"] and results["ids"][0]:
-            for i, doc_id in enumerate(results["ids"][0]):
-                distance = results["distances"][0][i]
-                # Convert distance to similarity (ChromaDB returns L2 distance)
-                similarity = 1 / (1 + distance)
+        for r, q in enumerate(pending):
+            row = scores[r]
+            order = top_idx[r][np.argsort(-row[top_idx[r]], kind="stable")]
+            similarities = row[order]
+            
+            corrections = []
+            seen_phrases = set()
+            for idx, similarity in zip(order, similarities):
+                # Terurut menurun: sisa kandidat pasti di bawah threshold
+                if similarity < threshold:
+                    break
+                metadata = self._kb_metadatas[idx]
+                correct_phrase = metadata["correct_phrase"]
                 
-                if similarity >= threshold:
-                    metadata = results["metadatas"][0][i]
-                    correct_phrase = metadata["correct_phrase"]
-                    
-                    # Avoid duplicates
-                    if correct_phrase not in seen_phrases:
-                        seen_phrases.add(correct_phrase)
-                        corrections.append({
-                            "correct_phrase": correct_phrase,
-                            "matched_text": results["documents"][0][i],
-                            "common_mistakes": json.loads(metadata["common_mistakes"]),
-                            "context": metadata["context"],
-                            "category": metadata["category"],
-                            "similarity": similarity
-                        })
-        
-        return corrections
+                # Avoid duplicates
+                if correct_phrase not in seen_phrases:
+                    seen_phrases.add(correct_phrase)
+                    corrections.append({
+                        "correct_phrase": correct_phrase,
+                        "matched_text": self._kb_documents[idx],
+                        "common_mistakes": json.loads(metadata["common_mistakes"]),
+                        "context": metadata["context"],
+                        "category": metadata["category"],
+                        "similarity": float(similarity)
+                    })
+                    if len(corrections) == top_k:
+                        break
+            all_corrections[q] = corrections
+        
+        self._semantic_cache_store(pending_mat, [all_corrections[q] for q in pending], cache_key)
+        return all_corrections
+    
+    def _semantic_cache_lookup(
+        self,
+        query_mat: np.ndarray,
+        cache_key: Tuple[int, float]
+    ) -> List[Optional[List[Dict[str, Any]]]]:
+        """Return cached results for queries within SEMANTIC_CACHE_THRESHOLD, else None."""
+        hits: List[Optional[List[Dict[str, Any]]]] = [None] * len(query_mat)
+        entry = self._semantic_cache.get(cache_key)
+        if entry is None:
+            return hits
+        
+        cache_mat, cache_results = entry
+        sims = query_mat @ cache_mat.T
+        best = np.argmax(sims, axis=1)
+        for q, idx in enumerate(best):
+            if sims[q, idx] >= config.SEMANTIC_CACHE_THRESHOLD:
+                hits[q] = list(cache_results[idx])
+        return hits
+    
+    def _semantic_cache_store(
+        self,
+        query_mat: np.ndarray,
+        results: List[List[Dict[str, Any]]],
+        cache_key: Tuple[int, float]
+    ):
+        """Append query embeddings + results to the cache, evicting the oldest (FIFO)."""
+        size = config.SEMANTIC_CACHE_SIZE
+        if size <= 0:
+            return
+        
+        entry = self._semantic_cache.get(cache_key)
+        if entry is not None:
+            query_mat = np.concatenate([entry[0], query_mat])
+            results = entry[1] + results
+        self._semantic_cache[cache_key] = (query_mat[-size:], results[-size:])
+    
+    def _ensure_kb_matrix(self):
+        """Rebuild the in-memory embedding matrix from the collection if it changed."""
+        if not self._kb_dirty:
+            return
+        
+        data = self.collection.get(include=["embeddings", "documents", "metadatas"])
+        self._semantic_cache.clear()
+        embeddings = data["embeddings"]
+        self._kb_size = 0
+        self._kb_mat = None
+        self._kb_int8 = None
+        self._kb_scales = None
+        if embeddings is not None and len(embeddings) > 0:
+            # Normalisasi ulang sekali di sini untuk data lama yang disimpan tanpa normalisasi
+            kb_mat = _l2_normalize(np.ascontiguousarray(embeddings, dtype=np.float32))
+            self._kb_size = kb_mat.shape[0]
+            if config.KB_QUANTIZATION == "int8":
+                self._kb_int8, self._kb_scales = _quantize_int8(kb_mat)
+            elif config.KB_QUANTIZATION == "fp16":
+                self._kb_mat = kb_mat.astype(np.float16)
+            else:
+                self._kb_mat = kb_mat
+        self._kb_documents = data["documents"] or []
+        self._kb_metadatas = data["metadatas"] or []
+        self._kb_trigrams = frozenset().union(*map(_trigrams, self._kb_documents))
+        self._kb_dirty = False
+    
+    def may_match(self, texts: List[str]) -> List[bool]:
+        """Cheap prefilter: False for texts sharing no character trigram with any KB document."""
+        self._ensure_kb_matrix()
+        kb_trigrams = self._kb_trigrams
+        return [not kb_trigrams.isdisjoint(_trigrams(text)) for text in texts]
+    
+    def _kb_dot(self, query_mat: np.ndarray) -> np.ndarray:
+        """Dot products between queries [Q, d] and every KB embedding -> [Q, N]."""
+        if self._kb_int8 is None and self._kb_mat.dtype == np.float32:
+            return query_mat @ self._kb_mat.T
+        
+        # Matriks terkuantisasi di-upcast per blok baris, supaya memori sementara
+        # tetap kecil dan tidak menghapus penghematan memori dari kuantisasi
+        scores = np.empty((query_mat.shape[0], self._kb_size), dtype=np.float32)
+        if self._kb_int8 is None:
+            for start in range(0, self._kb_size, _DOT_BLOCK_ROWS):
+                block = self._kb_mat[start:start + _DOT_BLOCK_ROWS].astype(np.float32)
+                scores[:, start:start + _DOT_BLOCK_ROWS] = query_mat @ block.T
+            # Error pembulatan bisa sedikit melewati rentang cosine
+            return np.clip(scores, -1.0, 1.0, out=scores)
+        
+        # Skala per-query, akumulasi int32 (int16 bisa overflow untuk d=384), lalu de-quantize
+        q_int8, q_scales = _quantize_int8(query_mat)
+        q_int32 = q_int8.astype(np.int32)
+        for start in range(0, self._kb_size, _DOT_BLOCK_ROWS):
+            block = self._kb_int8[start:start + _DOT_BLOCK_ROWS].astype(np.int32)
+            scores[:, start:start + _DOT_BLOCK_ROWS] = q_int32 @ block.T
+        scores *= q_scales[:, None]
+        scores *= self._kb_scales[None, :]
+        return np.clip(scores, -1.0, 1.0, out=scores)
     
     def load_knowledge_base(self, filepath: str) -> int:
         """Load corrections from a JSON knowledge base file."""
         with open(filepath, "r", encoding="utf-8") as f:
             data = json.load(f)
         
+        # Varian dari banyak entri ditulis bersama, per ~_WRITE_BATCH_ROWS baris
         count = 0
+        pending: List[Tuple[str, List[str], Dict[str, Any]]] = []
+        pending_rows = 0
         for entry in data.get("corrections", []):
-            self.add_correction(
+            row = self._correction_rows(
                 correct_phrase=entry["correct_phrase"],
                 common_mistakes=entry.get("common_mistakes", []),
                 context=entry.get("context", ""),
                 category=entry.get("category", "")
             )
+            pending.append(row)
+            pending_rows += len(row[1])
             count += 1
+            if pending_rows >= _WRITE_BATCH_ROWS:
+                self._write_corrections(pending)
+                pending, pending_rows = [], 0
+        self._write_corrections(pending)
         
         print(f"✓ Loaded {count} corrections from knowledge base")
         return count
@@ -141,7 +357,8 @@ class VectorStore:
         return {
             "collection_name": config.COLLECTION_NAME,
             "total_documents": self.collection.count(),
-            "persist_directory": config.CHROMA_PERSIST_DIR
+            "persist_directory": config.CHROMA_PERSIST_DIR,
+            "embedding_cache": self.embedding_model.get_stats()
         }
     
     def clear(self):
@@ -149,18 +366,48 @@ class VectorStore:
         self.client.delete_collection(config.COLLECTION_NAME)
         self.collection = self.client.create_collection(
             name=config.COLLECTION_NAME,
-            metadata={"description": "STT correction knowledge base"}
+            metadata=_COLLECTION_METADATA
         )
+        self._kb_dirty = True
         print("✓ Vector store cleared")
 
 
+def _trigrams(text: str) -> set:
+    """Lowercased character trigrams, space-padded so short words still yield some."""
+    padded = f" {text.lower()} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _phrase_id(correct_phrase: str) -> str:
+    """Deterministic 64-bit hex ID for a correct phrase."""
+    return hashlib.blake2b(correct_phrase.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _l2_normalize(mat: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length (zero rows are left as-is)."""
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def _quantize_int8(mat: np.ndarray):
+    """Symmetric per-row int8 quantization; returns (int8 matrix, float32 scales)."""
+    scales = np.max(np.abs(mat), axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(mat / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
 # Singleton instance
 _vector_store = None
+_vector_store_lock = threading.Lock()
 
 
 def get_vector_store() -> VectorStore:
     """Get or create singleton vector store instance."""
     global _vector_store
     if _vector_store is None:
-        _vector_store = VectorStore()
+        with _vector_store_lock:
+            if _vector_store is None:
+                _vector_store = VectorStore()
     return _vector_store